@@ -0,0 +1,233 @@
+import atexit
+import json
+import logging
+import queue
+import threading
+from datetime import datetime
+
+from flask import has_request_context, request
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from src import db
+from src.models.audit_event import AuditEvent
+from src.models.card import Card
+
+logger = logging.getLogger(__name__)
+
+# Tipos de evento registrados na trilha de auditoria
+LOGIN_SUCCESS = 'login_success'
+LOGIN_FAILED = 'login_failed'
+CARD_CREATED = 'card_created'
+CARD_UPDATED = 'card_updated'
+CARD_DELETED = 'card_deleted'
+
+# Colunas de texto limitadas: valores maiores são truncados ao enfileirar
+_TEXT_LIMITS = {
+    column.name: column.type.length
+    for column in AuditEvent.__table__.columns
+    if getattr(column.type, 'length', None)
+}
+
+
+class AuditWriter:
+    """Grava eventos de auditoria em lote, fora da thread da requisição.
+
+    As requisições apenas enfileiram o evento; uma thread em segundo plano
+    descarrega a fila na tabela audit_event com um único INSERT de várias
+    linhas quando o lote enche ou quando o intervalo de flush expira.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.batch_size = 100
+        self.flush_interval = 2.0
+        self.enqueue_timeout = 0.05
+        self.max_retries = 3
+        self.dropped = 0
+        self._queue = queue.Queue()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('AUDIT_BATCH_SIZE', 100)
+        app.config.setdefault('AUDIT_FLUSH_INTERVAL', 2.0)
+        app.config.setdefault('AUDIT_QUEUE_MAXSIZE', 10000)
+        app.config.setdefault('AUDIT_ENQUEUE_TIMEOUT', 0.05)
+        app.config.setdefault('AUDIT_MAX_RETRIES', 3)
+
+        self.app = app
+        self.batch_size = int(app.config['AUDIT_BATCH_SIZE'])
+        self.flush_interval = float(app.config['AUDIT_FLUSH_INTERVAL'])
+        self.enqueue_timeout = float(app.config['AUDIT_ENQUEUE_TIMEOUT'])
+        self.max_retries = int(app.config['AUDIT_MAX_RETRIES'])
+        self._queue = queue.Queue(maxsize=int(app.config['AUDIT_QUEUE_MAXSIZE']))
+        app.extensions['audit_writer'] = self
+        atexit.register(self.shutdown)
+
+    def record(self, event_type, username=None, card_id=None, ip_address=None, details=None):
+        """Enfileira um evento. Nunca bloqueia a requisição além de enqueue_timeout."""
+        event = {
+            'event_type': event_type,
+            'username': username,
+            'card_id': card_id,
+            'ip_address': ip_address,
+            'details': json.dumps(details, ensure_ascii=False) if details is not None else None,
+            'created_at': datetime.utcnow()
+        }
+        for name, length in _TEXT_LIMITS.items():
+            if isinstance(event[name], str) and len(event[name]) > length:
+                event[name] = event[name][:length]
+        try:
+            self._queue.put(event, timeout=self.enqueue_timeout)
+        except queue.Full:
+            # Backpressure limitado: com a fila cheia o evento é descartado
+            # em vez de segurar a requisição até o banco se recuperar
+            self.dropped += 1
+            logger.warning("Fila de auditoria cheia, evento %s descartado", event_type)
+            return False
+
+        self._ensure_thread()
+        if self._queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def flush(self):
+        """Grava todos os eventos pendentes. Retorna o número de linhas gravadas."""
+        written = 0
+        with self._flush_lock:
+            while True:
+                batch = self._drain(self.batch_size)
+                if not batch:
+                    break
+                try:
+                    self._insert(batch)
+                    written += len(batch)
+                except Exception as e:
+                    logger.error("Erro ao gravar %d eventos de auditoria: %s", len(batch), e)
+                    # Uma linha inválida não derruba o lote: grava linha a linha
+                    # e devolve à fila só as que falharem
+                    written += self._insert_rows(batch)
+                    break
+        return written
+
+    def shutdown(self, timeout=5.0):
+        """Para a thread de gravação e descarrega o que restou na fila."""
+        self._stop.set()
+        self._wakeup.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+        if self.app is not None:
+            self.flush()
+
+    def _insert(self, batch):
+        rows = [{key: value for key, value in event.items() if key != 'attempts'} for event in batch]
+        with self.app.app_context():
+            try:
+                db.session.execute(AuditEvent.__table__.insert().values(rows))
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+    def _insert_rows(self, batch):
+        written = 0
+        for event in batch:
+            try:
+                self._insert([event])
+                written += 1
+            except Exception as e:
+                self._retry(event, e)
+        return written
+
+    def _retry(self, event, error):
+        event['attempts'] = event.get('attempts', 0) + 1
+        if event['attempts'] <= self.max_retries:
+            try:
+                self._queue.put_nowait(event)
+                return
+            except queue.Full:
+                pass
+        self.dropped += 1
+        logger.error("Evento de auditoria %s descartado após %d tentativas: %s",
+                     event['event_type'], event['attempts'], error)
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _drain(self, limit):
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _ensure_thread(self):
+        # Thread criada sob demanda para sobreviver a forks do servidor
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+
+audit_writer = AuditWriter()
+
+
+# Auditoria de cards pelos eventos do mapper: cobre qualquer escrita via ORM.
+# Os eventos ficam pendentes na sessão e só entram na fila após o commit.
+
+def _pending_card_events(target):
+    session = object_session(target)
+    return session.info.setdefault('pending_audit_events', []) if session is not None else None
+
+@event.listens_for(Card, 'after_insert')
+def _audit_card_insert(mapper, connection, target):
+    pending = _pending_card_events(target)
+    if pending is not None:
+        pending.append((CARD_CREATED, target.id, {'ID_RC': target.ID_RC}))
+
+@event.listens_for(Card, 'after_update')
+def _audit_card_update(mapper, connection, target):
+    pending = _pending_card_events(target)
+    if pending is None:
+        return
+    state = inspect(target)
+    changed = sorted(attr.key for attr in state.attrs
+                     if attr.key != 'row_version' and attr.history.has_changes())
+    if not changed:
+        return
+    if 'deleted_at' in changed and target.deleted_at is not None:
+        pending.append((CARD_DELETED, target.id, {'ID_RC': target.ID_RC}))
+    else:
+        pending.append((CARD_UPDATED, target.id, {'ID_RC': target.ID_RC, 'fields': changed}))
+
+@event.listens_for(Session, 'after_commit')
+def _record_card_events(session):
+    pending = session.info.pop('pending_audit_events', None)
+    if not pending:
+        return
+    ip_address = request.remote_addr if has_request_context() else None
+    for event_type, card_id, details in pending:
+        audit_writer.record(event_type, card_id=card_id, ip_address=ip_address, details=details)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_card_events(session):
+    session.info.pop('pending_audit_events', None)
@@ -0,0 +1,23 @@
+from functools import wraps
+from flask import current_app, g, jsonify, request
+import jwt
+
+def role_required(*roles):
+    """Exige um token JWT válido (emitido em /api/login) com um dos papéis informados"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            header = request.headers.get('Authorization', '')
+            if not header.startswith('Bearer '):
+                return jsonify({'success': False, 'message': 'Token de autenticação ausente'}), 401
+            try:
+                payload = jwt.decode(header[len('Bearer '):], current_app.config['SECRET_KEY'],
+                                     algorithms=['HS256'])
+            except jwt.InvalidTokenError:
+                return jsonify({'success': False, 'message': 'Token inválido ou expirado'}), 401
+            if payload.get('role') not in roles:
+                return jsonify({'success': False, 'message': 'Acesso negado'}), 403
+            g.current_user = payload
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,157 @@
+import logging
+import threading
+import time
+
+from sqlalchemy import text
+
+from src import db
+from src.audit import audit_writer
+
+logger = logging.getLogger(__name__)
+
+
+class HealthMonitor:
+    """Estado de prontidão da instância com verificação do banco em cache.
+
+    Uma thread em segundo plano executa SELECT 1 a cada check_ttl segundos;
+    a sonda de prontidão só lê o último resultado, sem nunca esperar pelo
+    banco. A instância é drenada (503) quando o pool de conexões fica
+    saturado por mais de saturation_grace segundos.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.check_ttl = 5.0
+        self.saturation_grace = 30.0
+        self.last_ok = None
+        self.last_checked = None
+        self.last_error = None
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.in_flight = 0
+        self._saturated_since = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('READINESS_CHECK_TTL', 5.0)
+        app.config.setdefault('READINESS_SATURATION_GRACE', 30.0)
+
+        self.app = app
+        self.check_ttl = float(app.config['READINESS_CHECK_TTL'])
+        self.saturation_grace = float(app.config['READINESS_SATURATION_GRACE'])
+        app.extensions['health_monitor'] = self
+
+        @app.before_request
+        def _request_started():
+            with self._lock:
+                self.in_flight += 1
+
+        @app.teardown_request
+        def _request_finished(exc):
+            with self._lock:
+                self.in_flight -= 1
+
+    def refresh(self):
+        """Executa SELECT 1 e guarda o resultado."""
+        try:
+            with self.app.app_context():
+                db.session.execute(text('SELECT 1'))
+            ok, error = True, None
+        except Exception as e:
+            ok, error = False, e.__class__.__name__
+            logger.warning("Verificação de prontidão do banco falhou: %s", e)
+        with self._lock:
+            self.last_ok = ok
+            self.last_error = error
+            self.last_checked = time.monotonic()
+        return ok
+
+    def pool_stats(self):
+        with self.app.app_context():
+            pool = db.engine.pool
+        # SingletonThreadPool/StaticPool (SQLite em memória) não expõem contadores
+        stats = {
+            'size': pool.size() if hasattr(pool, 'size') else None,
+            'checked_out': pool.checkedout() if hasattr(pool, 'checkedout') else None,
+            # overflow() do QueuePool é negativo abaixo de size; reporta só conexões extras em uso
+            'overflow': max(0, pool.overflow()) if hasattr(pool, 'overflow') else None,
+            'max_overflow': getattr(pool, '_max_overflow', None)
+        }
+        stats['saturated'] = (
+            stats['checked_out'] is not None and stats['size'] is not None
+            and stats['max_overflow'] is not None and stats['max_overflow'] >= 0
+            and stats['checked_out'] >= stats['size'] + stats['max_overflow']
+        )
+        return stats
+
+    def readiness(self):
+        """Retorna (pronto, detalhes) sem acessar o banco."""
+        self._ensure_thread()
+        pool = self.pool_stats()
+        with self._lock:
+            now = time.monotonic()
+            fresh = self.last_checked is not None and now - self.last_checked <= self.check_ttl * 3
+            if fresh:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
+            if pool['saturated']:
+                if self._saturated_since is None:
+                    self._saturated_since = now
+            else:
+                self._saturated_since = None
+            draining = self._saturated_since is not None and now - self._saturated_since >= self.saturation_grace
+            hits, misses, in_flight = self.cache_hits, self.cache_misses, self.in_flight
+            last_ok, last_error, last_checked = self.last_ok, self.last_error, self.last_checked
+
+        checks = hits + misses
+        details = {
+            'database': {
+                'ok': last_ok,
+                'error': last_error,
+                'age_seconds': round(now - last_checked, 2) if last_checked is not None else None
+            },
+            'pool': pool,
+            'draining': draining,
+            'queues': {
+                'requests_in_flight': in_flight,
+                'audit_pending': audit_writer.pending()
+            },
+            'cache': {
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': round(hits / checks, 3) if checks else None
+            }
+        }
+        return bool(fresh and last_ok and not draining), details
+
+    def shutdown(self, timeout=5.0):
+        """Para a thread de verificação e espera ela terminar."""
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+
+    def _ensure_thread(self):
+        # Thread criada sob demanda para sobreviver a forks do servidor
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='health-monitor', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.check_ttl)
+
+
+health_monitor = HealthMonitor()
@@ -0,0 +1,139 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+from flask import g, has_request_context, request
+
+# Atributos padrão de LogRecord; o restante vem de extra= e vira campo do JSON
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Formata cada registro como uma linha JSON."""
+
+    def format(self, record):
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """Anexa o request_id da requisição atual ao registro.
+
+    Roda na thread da requisição, antes de o registro entrar na fila,
+    porque a thread do listener não tem contexto de requisição.
+    """
+
+    def filter(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = g.get('request_id') if has_request_context() else None
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Descarta parte dos registros marcados com extra={'sample': True}.
+
+    Registros não marcados passam sempre. Os que passam levam sample_rate
+    para que contagens possam ser reponderadas na análise.
+    """
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if not record.__dict__.pop('sample', False):
+            return True
+        if self.rate < 1.0 and random.random() >= self.rate:
+            return False
+        record.sample_rate = self.rate
+        return True
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler que adia a formatação da mensagem para o listener.
+
+    O prepare() padrão formata a mensagem na thread que chamou o logger;
+    aqui o registro vai intacto para a fila (mesmo processo, sem pickle).
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def configure_logging(level='INFO', sample_rate=1.0):
+    """Substitui os handlers da raiz por uma fila com saída JSON em segundo plano."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(JsonFormatter())
+
+    queue_handler = DeferredQueueHandler(queue.SimpleQueue())
+    queue_handler.addFilter(SamplingFilter(sample_rate))
+    queue_handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    # O access log do Werkzeug repetiria, sem amostragem nem request_id, a linha
+    # que init_request_logging já registra para cada requisição
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(queue_handler.queue, stream_handler)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
+
+
+def init_request_logging(app, slow_request_ms=1000):
+    """Registra request_id e tempo de cada requisição.
+
+    Requisições rápidas e bem-sucedidas são amostradas; lentas ou com erro
+    de servidor são sempre registradas.
+    """
+    logger = logging.getLogger('src.request')
+
+    @app.before_request
+    def _start_request():
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def _finish_request(response):
+        start = g.pop('request_start', None)
+        if start is None:
+            return response
+        duration_ms = round((time.perf_counter() - start) * 1000, 2)
+        response.headers['X-Request-ID'] = g.request_id
+        if logger.isEnabledFor(logging.INFO):
+            routine = response.status_code < 500 and duration_ms < slow_request_ms
+            logger.info("Requisição concluída", extra={
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'duration_ms': duration_ms,
+                'sample': routine
+            })
+        return response
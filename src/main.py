@@ -1,5 +1,6 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 import os
 import sys
 import logging
@@ -8,15 +9,29 @@ import jwt  # <-- Adicione aqui
 import bcrypt
 
 from src import db
+from src.logging_config import configure_logging, init_request_logging
 from src.models.user import User
-from src.models.card import Card
+from src.models.card import Card, CardVersionCounter, migrate_card_versions
+from src.models.audit_event import AuditEvent
+from src.models.card_sketch import backfill_card_sketches
+from src.auth import role_required
 from src.routes.user import user_bp
+from src.routes.audit import audit_bp
+from src.routes.health import health_bp
+from src.routes.dashboard import dashboard_bp
+from src.audit import audit_writer, LOGIN_SUCCESS, LOGIN_FAILED
+from src.health import health_monitor
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO)
+# Configurar logging: JSON assíncrono via fila, com amostragem de eventos frequentes
+configure_logging(
+    level=os.environ.get('LOG_LEVEL', 'INFO').upper(),
+    sample_rate=float(os.environ.get('LOG_SAMPLE_RATE', 0.1))
+)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+# O Render fica à frente da aplicação: remote_addr deve vir do X-Forwarded-For
+app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1)
 
 # Configurações de ambiente
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'orbit-secret-key-2025')
@@ -30,8 +45,8 @@ if not database_url:
     os.makedirs(db_dir, exist_ok=True)
     db_path = os.path.join(db_dir, 'orbit.db')
     database_url = f'sqlite:///{db_path}'
-    logger.info(f"Criado diretório para banco de dados: {db_dir}")
-    logger.info(f"Usando banco de dados SQLite em: {db_path}")
+    logger.info("Criado diretório para banco de dados: %s", db_dir)
+    logger.info("Usando banco de dados SQLite em: %s", db_path)
 elif database_url.startswith('sqlite:///'):
     # Extrair o caminho do arquivo do SQLite
     db_path = database_url.replace('sqlite:///', '')
@@ -39,14 +54,14 @@ elif database_url.startswith('sqlite:///'):
     # Converter para caminho absoluto se for relativo
     if not os.path.isabs(db_path):
         abs_db_path = os.path.abspath(os.path.join(os.getcwd(), db_path))
-        logger.info(f"Convertendo caminho SQLite relativo para absoluto: {db_path} -> {abs_db_path}")
+        logger.info("Convertendo caminho SQLite relativo para absoluto: %s -> %s", db_path, abs_db_path)
         db_path = abs_db_path
         database_url = f'sqlite:///{db_path}'
     
     # Criar diretório para o banco de dados
     db_dir = os.path.dirname(db_path)
     os.makedirs(db_dir, exist_ok=True)
-    logger.info(f"Garantindo que o diretório do banco existe: {db_dir}")
+    logger.info("Garantindo que o diretório do banco existe: %s", db_dir)
     
     # Verificar permissões
     try:
@@ -55,15 +70,15 @@ elif database_url.startswith('sqlite:///'):
         with open(test_file, 'w') as f:
             f.write('test')
         os.remove(test_file)
-        logger.info(f"Diretório {db_dir} tem permissões de escrita")
+        logger.info("Diretório %s tem permissões de escrita", db_dir)
     except Exception as e:
-        logger.error(f"Erro ao verificar permissões no diretório {db_dir}: {str(e)}")
+        logger.error("Erro ao verificar permissões no diretório %s: %s", db_dir, e)
         # Tentar usar um diretório alternativo com permissões garantidas
         alt_db_dir = os.path.abspath(os.path.join(os.getcwd(), 'instance'))
         os.makedirs(alt_db_dir, exist_ok=True)
         alt_db_path = os.path.join(alt_db_dir, 'orbit.db')
         database_url = f'sqlite:///{alt_db_path}'
-        logger.warning(f"Usando diretório alternativo para banco de dados: {alt_db_dir}")
+        logger.warning("Usando diretório alternativo para banco de dados: %s", alt_db_dir)
 
 # Corrigir prefixo postgres:// para postgresql:// (necessário para SQLAlchemy 1.4+)
 if database_url and database_url.startswith('postgres://'):
@@ -72,27 +87,31 @@ if database_url and database_url.startswith('postgres://'):
 app.config['SQLALCHEMY_DATABASE_URI'] = database_url
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-logger.info(f"Configuração final do banco de dados: {database_url}")
+# Auditoria: eventos gravados em lote por uma thread em segundo plano
+app.config['AUDIT_BATCH_SIZE'] = int(os.environ.get('AUDIT_BATCH_SIZE', 100))
+app.config['AUDIT_FLUSH_INTERVAL'] = float(os.environ.get('AUDIT_FLUSH_INTERVAL', 2.0))
+app.config['AUDIT_QUEUE_MAXSIZE'] = int(os.environ.get('AUDIT_QUEUE_MAXSIZE', 10000))
+app.config['AUDIT_MAX_RETRIES'] = int(os.environ.get('AUDIT_MAX_RETRIES', 3))
+
+# Readiness: SELECT 1 em cache e tolerância à saturação do pool antes de drenar
+app.config['READINESS_CHECK_TTL'] = float(os.environ.get('READINESS_CHECK_TTL', 5.0))
+app.config['READINESS_SATURATION_GRACE'] = float(os.environ.get('READINESS_SATURATION_GRACE', 30.0))
+
+logger.info("Configuração final do banco de dados: %s", database_url)
 
 # Inicializar extensões
 db.init_app(app)
+init_request_logging(app, slow_request_ms=float(os.environ.get('LOG_SLOW_REQUEST_MS', 1000)))
+audit_writer.init_app(app)
+health_monitor.init_app(app)
 CORS(app, resources={r"/api/*": {"origins": "*"}}, supports_credentials=True)
 
 app.register_blueprint(user_bp, url_prefix='/api')
+app.register_blueprint(audit_bp, url_prefix='/api')
+app.register_blueprint(health_bp, url_prefix='/api')
+app.register_blueprint(dashboard_bp, url_prefix='/api')
 
 # Rotas
-@app.route('/api/health', methods=['GET'])
-def health_check():
-    return jsonify({
-        'status': 'healthy',
-        'timestamp': datetime.utcnow().isoformat(),
-        'version': '2.0.0',
-        'database': app.config['SQLALCHEMY_DATABASE_URI'],
-        'environment': os.environ.get('FLASK_ENV', 'production'),
-        'working_directory': os.getcwd(),
-        'database_directory': os.path.dirname(app.config['SQLALCHEMY_DATABASE_URI'].replace('sqlite:///', '')) if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite:///') else 'N/A'
-    })
-
 @app.route('/api/login', methods=['POST'])
 def login():
     try:
@@ -103,7 +122,7 @@ def login():
         username = data['username']
         password = data['password']
 
-        logger.info(f"Tentativa de login para usuário: {username}")
+        logger.info("Tentativa de login para usuário: %s", username, extra={'sample': True})
 
         user = User.query.filter_by(username=username).first()
         
@@ -116,7 +135,8 @@ def login():
                 'exp': datetime.utcnow() + timedelta(hours=24)
             }, app.config['SECRET_KEY'], algorithm='HS256')
 
-            logger.info(f"Login bem-sucedido para usuário: {username}")
+            logger.info("Login bem-sucedido para usuário: %s", username, extra={'sample': True})
+            audit_writer.record(LOGIN_SUCCESS, username=username, ip_address=request.remote_addr)
             
             return jsonify({
                 'success': True,
@@ -124,23 +144,31 @@ def login():
                 'user': user.to_dict()
             })
         else:
-            logger.warning(f"Login falhou para usuário: {username}")
+            logger.warning("Login falhou para usuário: %s", username)
+            audit_writer.record(LOGIN_FAILED, username=username, ip_address=request.remote_addr)
             return jsonify({'success': False, 'message': 'Credenciais inválidas'}), 401
 
     except Exception as e:
-        logger.error(f"Erro no login: {str(e)}")
+        logger.error("Erro no login: %s", e)
         return jsonify({'success': False, 'message': 'Erro interno do servidor'}), 500
 
+# Limite de alterações por página em /api/cards/changes
+MAX_CHANGES_PAGE_SIZE = 500
+
 @app.route('/api/cards', methods=['GET'])
 def get_cards():
     try:
-        cards = Card.query.all()
+        # Versão lida antes dos cards: a próxima sincronização pode repetir
+        # uma alteração, mas nunca perder uma confirmada entre as consultas
+        version = db.session.get(CardVersionCounter, 1)
+        cards = Card.query.filter(Card.deleted_at.is_(None)).all()
         return jsonify({
             'success': True,
-            'cards': [card.to_dict() for card in cards]
+            'cards': [card.to_dict() for card in cards],
+            'version': version.value if version else 0
         })
     except Exception as e:
-        logger.error(f"Erro ao buscar cards: {str(e)}")
+        logger.error("Erro ao buscar cards: %s", e)
         return jsonify({'success': False, 'message': 'Erro ao buscar cards'}), 500
 
 @app.route('/api/cards', methods=['POST'])
@@ -166,9 +194,54 @@ def create_card():
         }), 201
 
     except Exception as e:
-        logger.error(f"Erro ao criar card: {str(e)}")
+        logger.error("Erro ao criar card: %s", e)
         return jsonify({'success': False, 'message': 'Erro ao criar card'}), 500
 
+@app.route('/api/cards/changes', methods=['GET'])
+def get_card_changes():
+    """Cards criados, alterados ou excluídos depois da versão since"""
+    try:
+        since = int(request.args.get('since', 0))
+        limit = min(max(int(request.args.get('limit', 100)), 1), MAX_CHANGES_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Parâmetros since e limit devem ser inteiros'}), 400
+
+    try:
+        cards = (Card.query
+                 .filter(Card.row_version > since)
+                 .order_by(Card.row_version)
+                 .limit(limit + 1)
+                 .all())
+        has_more = len(cards) > limit
+        cards = cards[:limit]
+        return jsonify({
+            'success': True,
+            'changes': [card.to_change_dict() for card in cards],
+            'next_since': cards[-1].row_version if cards else since,
+            'has_more': has_more
+        })
+    except Exception as e:
+        logger.error("Erro ao buscar alterações de cards: %s", e)
+        return jsonify({'success': False, 'message': 'Erro ao buscar alterações'}), 500
+
+@app.route('/api/cards/<int:card_id>', methods=['DELETE'])
+@role_required('Administrador', 'Gerente de Setor')
+def delete_card(card_id):
+    try:
+        card = Card.query.filter(Card.id == card_id, Card.deleted_at.is_(None)).first()
+        if card is None:
+            return jsonify({'success': False, 'message': 'Card não encontrado'}), 404
+
+        # Exclusão lógica: o tombstone recebe nova versão e chega aos clientes
+        card.deleted_at = datetime.utcnow()
+        db.session.commit()
+
+        return jsonify({'success': True, 'card': card.to_change_dict()})
+    except Exception as e:
+        db.session.rollback()
+        logger.error("Erro ao excluir card: %s", e)
+        return jsonify({'success': False, 'message': 'Erro ao excluir card'}), 500
+
 @app.route('/api/sla', methods=['GET'])
 def get_sla_metrics():
     try:
@@ -195,7 +268,7 @@ def get_sla_metrics():
             'metrics': metrics
         })
     except Exception as e:
-        logger.error(f"Erro ao buscar métricas SLA: {str(e)}")
+        logger.error("Erro ao buscar métricas SLA: %s", e)
         return jsonify({'success': False, 'message': 'Erro ao buscar métricas'}), 500
 
 @app.route('/api/kanban-data', methods=['GET'])
@@ -205,11 +278,12 @@ def kanban_data():
 @app.route('/api/dashboard-stats', methods=['GET'])
 def dashboard_stats():
     try:
-        total_requisicoes = Card.query.count()
-        valor_total = db.session.query(db.func.sum(Card.Valor_Estimado)).scalar() or 0
+        active_cards = Card.query.filter(Card.deleted_at.is_(None))
+        total_requisicoes = active_cards.count()
+        valor_total = db.session.query(db.func.sum(Card.Valor_Estimado)).filter(Card.deleted_at.is_(None)).scalar() or 0
         status_distribution = {}
         for status in ["Solicitado", "Em Análise", "Aprovado", "Recebido", "Rejeitado"]:
-            status_distribution[status] = Card.query.filter_by(Status=status).count()
+            status_distribution[status] = active_cards.filter_by(Status=status).count()
         data = {
             "total_requisicoes": total_requisicoes,
             "valor_total": valor_total,
@@ -217,7 +291,7 @@ def dashboard_stats():
         }
         return jsonify({"success": True, "data": data})
     except Exception as e:
-        logger.error(f"Erro ao buscar dashboard stats: {str(e)}")
+        logger.error("Erro ao buscar dashboard stats: %s", e)
         return jsonify({"success": False, "message": "Erro ao buscar estatísticas"}), 500
 
 @app.route('/api/dashboard-stats', methods=['OPTIONS'])
@@ -246,7 +320,7 @@ def create_default_users():
             db.session.commit()
             logger.info("Usuários padrão criados com sucesso")
     except Exception as e:
-        logger.error(f"Erro ao criar usuários padrão: {str(e)}")
+        logger.error("Erro ao criar usuários padrão: %s", e)
 
 def create_sample_cards():
     """Criar cards de exemplo se não existirem"""
@@ -462,23 +536,31 @@ def create_sample_cards():
             db.session.commit()
             logger.info("Cards de exemplo criados com sucesso")
     except Exception as e:
-        logger.error(f"Erro ao criar cards de exemplo: {str(e)}")
+        logger.error("Erro ao criar cards de exemplo: %s", e)
+
+def init_database():
+    """Criar tabelas, migrar bancos antigos e popular dados iniciais"""
+    db.create_all()
+    logger.info("Banco de dados e tabelas criados com sucesso")
+    migrated = migrate_card_versions()
+    if migrated:
+        logger.info("Versões atribuídas a %d cards existentes", migrated)
+    create_default_users()
+    create_sample_cards()
+    backfill_card_sketches()
 
 if __name__ == '__main__':
     # Mostrar informações do ambiente
-    logger.info(f"Python version: {sys.version}")
-    logger.info(f"Current directory: {os.getcwd()}")
-    logger.info(f"Environment variables: DATABASE_URL={'set' if os.environ.get('DATABASE_URL') else 'not set'}")
+    logger.info("Python version: %s", sys.version)
+    logger.info("Current directory: %s", os.getcwd())
+    logger.info("Environment variables: DATABASE_URL=%s", 'set' if os.environ.get('DATABASE_URL') else 'not set')
     
     # Criar banco de dados e tabelas
     with app.app_context():
         try:
-            db.create_all()
-            logger.info("Banco de dados e tabelas criados com sucesso")
-            create_default_users()
-            create_sample_cards()
+            init_database()
         except Exception as e:
-            logger.error(f"Erro ao inicializar banco de dados: {str(e)}")
+            logger.error("Erro ao inicializar banco de dados: %s", e)
             sys.exit(1)
     
     port = int(os.environ.get('PORT', 5000))
@@ -0,0 +1,28 @@
+from datetime import datetime
+from src import db
+
+class AuditEvent(db.Model):
+    __tablename__ = 'audit_event'
+    __table_args__ = (
+        # Paginação por intervalo de tempo usa (created_at, id) como cursor
+        db.Index('ix_audit_event_created_at_id', 'created_at', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    event_type = db.Column(db.String(50), nullable=False)
+    username = db.Column(db.String(80))
+    card_id = db.Column(db.Integer)
+    ip_address = db.Column(db.String(45))
+    details = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'event_type': self.event_type,
+            'username': self.username,
+            'card_id': self.card_id,
+            'ip_address': self.ip_address,
+            'details': self.details,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
@@ -1,7 +1,13 @@
 from datetime import datetime
+from sqlalchemy import DDL, event, inspect, text
 from src import db
 
 class Card(db.Model):
+    __table_args__ = (
+        # Recalcular o sketch de (Unidade, dia) lê só os cards daquele dia
+        db.Index('ix_card_unidade_data_criacao', 'Unidade', 'Data_Criacao'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     ID_RC = db.Column(db.String(50), unique=True, nullable=False)
     Criado_Por = db.Column(db.String(120), nullable=False)
@@ -11,9 +17,14 @@ class Card(db.Model):
     Unidade = db.Column(db.String(100), default='Maracanaú')
     Fornecedor_Sugerido = db.Column(db.String(120), default='N/A')
     Data_Criacao = db.Column(db.DateTime, default=datetime.utcnow)
+    # Versão de linha monotônica usada pela sincronização incremental
+    row_version = db.Column(db.BigInteger, nullable=False, unique=True, index=True)
+    # Tombstone: cards excluídos permanecem para que a exclusão seja sincronizada
+    deleted_at = db.Column(db.DateTime)
 
     def to_dict(self):
         return {
+            "id": self.id,
             "ID_RC": self.ID_RC,
             "Criado_Por": self.Criado_Por,
             "Valor_Estimado": self.Valor_Estimado,
@@ -21,5 +32,89 @@ class Card(db.Model):
             "Tipo_Requisicao": self.Tipo_Requisicao,
             "Unidade": self.Unidade,
             "Fornecedor_Sugerido": self.Fornecedor_Sugerido,
-            "Data_Criacao": self.Data_Criacao.isoformat() if self.Data_Criacao else None
-        }
\ No newline at end of file
+            "Data_Criacao": self.Data_Criacao.isoformat() if self.Data_Criacao else None,
+            "row_version": self.row_version
+        }
+
+    def to_change_dict(self):
+        if self.deleted_at is not None:
+            return {
+                "id": self.id,
+                "ID_RC": self.ID_RC,
+                "row_version": self.row_version,
+                "deleted": True,
+                "deleted_at": self.deleted_at.isoformat()
+            }
+        return dict(self.to_dict(), deleted=False)
+
+class CardVersionCounter(db.Model):
+    """Contador de linha única que fornece as versões de Card.
+
+    O UPDATE no contador bloqueia a linha até o commit, então transações
+    que alteram cards confirmam na mesma ordem das versões atribuídas e
+    um cliente nunca pula uma alteração confirmada mais tarde.
+    """
+    __tablename__ = 'card_version_counter'
+
+    id = db.Column(db.Integer, primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+
+event.listen(
+    CardVersionCounter.__table__,
+    'after_create',
+    DDL('INSERT INTO card_version_counter (id, value) VALUES (1, 0)')
+)
+
+def next_row_version(connection):
+    counter = CardVersionCounter.__table__
+    connection.execute(counter.update().where(counter.c.id == 1).values(value=counter.c.value + 1))
+    return connection.execute(db.select(counter.c.value).where(counter.c.id == 1)).scalar_one()
+
+@event.listens_for(Card, 'before_insert')
+def assign_row_version(mapper, connection, target):
+    target.row_version = next_row_version(connection)
+
+@event.listens_for(Card, 'before_update')
+def bump_row_version(mapper, connection, target):
+    # before_update também roda para objetos sujos sem mudança real
+    # (ex.: card.Status = card.Status); esses não geram nova versão
+    state = inspect(target)
+    if not any(attr.history.has_changes() for attr in state.attrs if attr.key != 'row_version'):
+        return
+    target.row_version = next_row_version(connection)
+
+def migrate_card_versions():
+    """Atualizar bancos criados antes de row_version/deleted_at (idempotente).
+
+    Adiciona as colunas e índices que faltarem, cria e semeia card_version_counter e
+    numera os cards sem versão em ordem de id, deixando o contador na
+    maior versão atribuída.
+    """
+    columns = {column['name'] for column in inspect(db.engine).get_columns('card')}
+    with db.engine.begin() as connection:
+        if 'row_version' not in columns:
+            connection.execute(text('ALTER TABLE card ADD COLUMN row_version BIGINT'))
+        if 'deleted_at' not in columns:
+            connection.execute(text('ALTER TABLE card ADD COLUMN deleted_at TIMESTAMP'))
+        connection.execute(text('CREATE UNIQUE INDEX IF NOT EXISTS ix_card_row_version ON card (row_version)'))
+        connection.execute(text(
+            'CREATE INDEX IF NOT EXISTS ix_card_unidade_data_criacao ON card ("Unidade", "Data_Criacao")'
+        ))
+
+        CardVersionCounter.__table__.create(connection, checkfirst=True)
+        counter = CardVersionCounter.__table__
+        current = connection.execute(db.select(counter.c.value).where(counter.c.id == 1)).scalar()
+        if current is None:
+            current = 0
+            connection.execute(counter.insert().values(id=1, value=0))
+
+        card = Card.__table__
+        current = max(current, connection.execute(db.select(db.func.max(card.c.row_version))).scalar() or 0)
+        unversioned = connection.execute(
+            db.select(card.c.id).where(card.c.row_version.is_(None)).order_by(card.c.id)
+        ).scalars().all()
+        for card_id in unversioned:
+            current += 1
+            connection.execute(card.update().where(card.c.id == card_id).values(row_version=current))
+        connection.execute(counter.update().where(counter.c.id == 1).values(value=current))
+    return len(unversioned)
@@ -0,0 +1,159 @@
+from datetime import datetime, time, timedelta
+from sqlalchemy import event, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from src import db
+from src.models.card import Card
+from src.sketches import KllSketch, HyperLogLog
+
+# Valor padrão de Fornecedor_Sugerido; não conta como fornecedor distinto
+NO_SUPPLIER = 'N/A'
+
+class CardValueSketch(db.Model):
+    """Sketches diários de Valor_Estimado e Fornecedor_Sugerido por unidade."""
+    __tablename__ = 'card_value_sketch'
+    __table_args__ = (
+        db.UniqueConstraint('Unidade', 'day', name='uq_card_value_sketch_unidade_day'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    Unidade = db.Column(db.String(100), nullable=False)
+    day = db.Column(db.Date, nullable=False, index=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    value_quantiles = db.Column(db.LargeBinary, nullable=False)
+    supplier_hll = db.Column(db.LargeBinary, nullable=False)
+
+_UPSERT_DIALECTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+def _ensure_sketch_row(connection, unidade, day):
+    """Garante a linha de (unidade, dia) sem falhar se outra transação criá-la antes"""
+    table = CardValueSketch.__table__
+    values = {
+        'Unidade': unidade,
+        'day': day,
+        'count': 0,
+        'value_quantiles': KllSketch().to_bytes(),
+        'supplier_hll': HyperLogLog().to_bytes()
+    }
+    upsert = _UPSERT_DIALECTS.get(connection.dialect.name)
+    if upsert is not None:
+        connection.execute(
+            upsert(table).values(**values).on_conflict_do_nothing(index_elements=['Unidade', 'day'])
+        )
+        return
+    try:
+        with connection.begin_nested():
+            connection.execute(table.insert().values(**values))
+    except IntegrityError:
+        pass
+
+def add_card_to_sketch(connection, unidade, day, valor, fornecedor):
+    """Soma um card ao sketch de (unidade, dia) na transação da conexão."""
+    table = CardValueSketch.__table__
+    _ensure_sketch_row(connection, unidade, day)
+    # Com a linha garantida, o FOR UPDATE serializa escritores concorrentes
+    row = connection.execute(
+        db.select(table)
+        .where(table.c.Unidade == unidade, table.c.day == day)
+        .with_for_update()
+    ).one()
+
+    quantiles = KllSketch.from_bytes(row.value_quantiles)
+    suppliers = HyperLogLog.from_bytes(row.supplier_hll)
+    quantiles.update(valor)
+    if fornecedor and fornecedor != NO_SUPPLIER:
+        suppliers.add(fornecedor)
+
+    connection.execute(table.update().where(table.c.id == row.id).values(
+        count=row.count + 1,
+        value_quantiles=quantiles.to_bytes(),
+        supplier_hll=suppliers.to_bytes()
+    ))
+
+def rebuild_sketch_row(connection, unidade, day):
+    """Recalcula o sketch de (unidade, dia) a partir dos cards não excluídos.
+
+    Usado quando um card muda ou é excluído, já que sketches não permitem
+    remover valores. Um dia tem poucos cards, então o recálculo é barato.
+    As escritas de card já são serializadas pelo contador de versões, então
+    a consulta enxerga as alterações confirmadas antes desta.
+    """
+    card = Card.__table__
+    start = datetime.combine(day, time.min)
+    rows = connection.execute(
+        db.select(card.c.Valor_Estimado, card.c.Fornecedor_Sugerido)
+        .where(card.c.Unidade == unidade,
+               card.c.Data_Criacao >= start,
+               card.c.Data_Criacao < start + timedelta(days=1),
+               card.c.deleted_at.is_(None))
+    ).all()
+
+    table = CardValueSketch.__table__
+    where = (table.c.Unidade == unidade, table.c.day == day)
+    if not rows:
+        connection.execute(table.delete().where(*where))
+        return
+
+    quantiles, suppliers = KllSketch(), HyperLogLog()
+    for valor, fornecedor in rows:
+        quantiles.update(valor)
+        if fornecedor and fornecedor != NO_SUPPLIER:
+            suppliers.add(fornecedor)
+
+    _ensure_sketch_row(connection, unidade, day)
+    connection.execute(db.select(table.c.id).where(*where).with_for_update()).one()
+    connection.execute(table.update().where(*where).values(
+        count=len(rows),
+        value_quantiles=quantiles.to_bytes(),
+        supplier_hll=suppliers.to_bytes()
+    ))
+
+# Campos que afetam os sketches; Unidade e Data_Criacao também definem a linha
+SKETCH_FIELDS = ('Valor_Estimado', 'Unidade', 'Fornecedor_Sugerido', 'Data_Criacao', 'deleted_at')
+
+# active_history carrega o valor anterior mesmo de atributos expirados, para
+# que a linha de origem seja recalculada quando o card muda de unidade ou dia
+@event.listens_for(Card.Unidade, 'set', active_history=True)
+@event.listens_for(Card.Data_Criacao, 'set', active_history=True)
+def _keep_previous_sketch_key(target, value, oldvalue, initiator):
+    pass
+
+@event.listens_for(Card, 'after_insert')
+def update_card_sketch(mapper, connection, target):
+    if target.deleted_at is not None:
+        return
+    created = target.Data_Criacao or datetime.utcnow()
+    add_card_to_sketch(connection, target.Unidade, created.date(),
+                       target.Valor_Estimado, target.Fornecedor_Sugerido)
+
+@event.listens_for(Card, 'after_update')
+def refresh_card_sketch(mapper, connection, target):
+    state = inspect(target)
+    if not any(state.attrs[field].history.has_changes() for field in SKETCH_FIELDS):
+        return
+
+    keys = set()
+    for unidade, created in ((target.Unidade, target.Data_Criacao), _previous_key(state)):
+        if unidade is not None and created is not None:
+            keys.add((unidade, created.date()))
+    for unidade, day in keys:
+        rebuild_sketch_row(connection, unidade, day)
+
+def _previous_key(state):
+    def previous(field):
+        history = state.attrs[field].history
+        return history.deleted[0] if history.deleted else state.attrs[field].value
+    return previous('Unidade'), previous('Data_Criacao')
+
+def backfill_card_sketches():
+    """Reconstruir os sketches a partir da tabela card, se ainda estiverem vazios"""
+    if CardValueSketch.query.first() is not None:
+        return 0
+    cards = Card.query.filter(Card.deleted_at.is_(None)).all()
+    connection = db.session.connection()
+    for card in cards:
+        created = card.Data_Criacao or datetime.utcnow()
+        add_card_to_sketch(connection, card.Unidade, created.date(),
+                           card.Valor_Estimado, card.Fornecedor_Sugerido)
+    db.session.commit()
+    return len(cards)
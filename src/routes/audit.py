@@ -0,0 +1,66 @@
+import logging
+from datetime import datetime
+from flask import Blueprint, jsonify, request
+from src.auth import role_required
+from src.models.audit_event import AuditEvent
+from src import db
+
+logger = logging.getLogger(__name__)
+
+audit_bp = Blueprint('audit', __name__)
+
+MAX_PAGE_SIZE = 200
+
+def _parse_datetime(value):
+    return datetime.fromisoformat(value) if value else None
+
+@audit_bp.route('/audit-events', methods=['GET'])
+@role_required('Administrador')
+def get_audit_events():
+    """Listar eventos de auditoria do mais recente para o mais antigo.
+
+    Filtros opcionais: start, end (ISO 8601) e event_type. A paginação usa
+    o cursor next_cursor devolvido na página anterior.
+    """
+    try:
+        start = _parse_datetime(request.args.get('start'))
+        end = _parse_datetime(request.args.get('end'))
+        limit = min(max(int(request.args.get('limit', 50)), 1), MAX_PAGE_SIZE)
+        cursor = request.args.get('cursor')
+        cursor_time, cursor_id = None, None
+        if cursor:
+            cursor_value, _, cursor_id_value = cursor.rpartition('|')
+            cursor_time = datetime.fromisoformat(cursor_value)
+            cursor_id = int(cursor_id_value)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Parâmetros de consulta inválidos'}), 400
+
+    try:
+        query = AuditEvent.query
+        if start:
+            query = query.filter(AuditEvent.created_at >= start)
+        if end:
+            query = query.filter(AuditEvent.created_at < end)
+        if request.args.get('event_type'):
+            query = query.filter(AuditEvent.event_type == request.args['event_type'])
+        if cursor_time is not None:
+            query = query.filter(db.or_(
+                AuditEvent.created_at < cursor_time,
+                db.and_(AuditEvent.created_at == cursor_time, AuditEvent.id < cursor_id)
+            ))
+
+        events = query.order_by(AuditEvent.created_at.desc(), AuditEvent.id.desc()).limit(limit + 1).all()
+        next_cursor = None
+        if len(events) > limit:
+            events = events[:limit]
+            last = events[-1]
+            next_cursor = f"{last.created_at.isoformat()}|{last.id}"
+
+        return jsonify({
+            'success': True,
+            'events': [event.to_dict() for event in events],
+            'next_cursor': next_cursor
+        })
+    except Exception as e:
+        logger.error("Erro ao buscar eventos de auditoria: %s", e)
+        return jsonify({'success': False, 'message': 'Erro ao buscar eventos de auditoria'}), 500
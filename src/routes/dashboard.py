@@ -0,0 +1,76 @@
+import logging
+from datetime import date
+from flask import Blueprint, jsonify, request
+from src.models.card_sketch import CardValueSketch
+from src.sketches import (KllSketch, HyperLogLog, KLL_DEFAULT_K, HLL_DEFAULT_P,
+                          kll_rank_error, hll_relative_error)
+
+logger = logging.getLogger(__name__)
+
+dashboard_bp = Blueprint('dashboard', __name__)
+
+# Limites documentados em src/sketches.py
+ERROR_BOUNDS = {
+    'quantiles': {
+        'algorithm': 'KLL',
+        'k': KLL_DEFAULT_K,
+        'rank_error': round(kll_rank_error(KLL_DEFAULT_K), 4),
+        'note': 'Exato enquanto o grupo tiver menos de k valores'
+    },
+    'distinct_suppliers': {
+        'algorithm': 'HyperLogLog',
+        'precision': HLL_DEFAULT_P,
+        'relative_standard_error': round(hll_relative_error(HLL_DEFAULT_P), 4)
+    }
+}
+
+@dashboard_bp.route('/dashboard/value-distribution', methods=['GET'])
+def value_distribution():
+    """Mediana, p90, p99 de Valor_Estimado e fornecedores distintos por unidade e mês.
+
+    Filtros opcionais: start, end (YYYY-MM-DD, inclusivos) e unidade.
+    """
+    try:
+        start = date.fromisoformat(request.args['start']) if request.args.get('start') else None
+        end = date.fromisoformat(request.args['end']) if request.args.get('end') else None
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Datas devem estar no formato YYYY-MM-DD'}), 400
+
+    try:
+        query = CardValueSketch.query
+        if start:
+            query = query.filter(CardValueSketch.day >= start)
+        if end:
+            query = query.filter(CardValueSketch.day <= end)
+        if request.args.get('unidade'):
+            query = query.filter(CardValueSketch.Unidade == request.args['unidade'])
+
+        groups = {}
+        for row in query.all():
+            key = (row.Unidade, row.day.strftime('%Y-%m'))
+            quantiles = KllSketch.from_bytes(row.value_quantiles)
+            suppliers = HyperLogLog.from_bytes(row.supplier_hll)
+            if key in groups:
+                groups[key]['count'] += row.count
+                groups[key]['quantiles'].merge(quantiles)
+                groups[key]['suppliers'].merge(suppliers)
+            else:
+                groups[key] = {'count': row.count, 'quantiles': quantiles, 'suppliers': suppliers}
+
+        data = []
+        for (unidade, month), group in sorted(groups.items()):
+            quantiles = group['quantiles']
+            data.append({
+                'Unidade': unidade,
+                'month': month,
+                'count': group['count'],
+                'p50': quantiles.quantile(0.5),
+                'p90': quantiles.quantile(0.9),
+                'p99': quantiles.quantile(0.99),
+                'distinct_suppliers': group['suppliers'].count()
+            })
+
+        return jsonify({'success': True, 'data': data, 'error_bounds': ERROR_BOUNDS})
+    except Exception as e:
+        logger.error("Erro ao calcular distribuição de valores: %s", e)
+        return jsonify({'success': False, 'message': 'Erro ao calcular distribuição de valores'}), 500
@@ -0,0 +1,33 @@
+from datetime import datetime
+from flask import Blueprint, jsonify
+from src.health import health_monitor
+
+health_bp = Blueprint('health', __name__)
+
+VERSION = '2.0.0'
+
+@health_bp.route('/health', methods=['GET'])
+def health_check():
+    """Liveness: o processo responde. Não acessa o banco."""
+    return jsonify({
+        'status': 'healthy',
+        'timestamp': datetime.utcnow().isoformat(),
+        'version': VERSION
+    })
+
+@health_bp.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness: banco acessível (resultado em cache) e pool sem saturação."""
+    ready, details = health_monitor.readiness()
+    if ready:
+        status = 'ready'
+    elif details['draining']:
+        status = 'draining'
+    else:
+        status = 'unavailable'
+    return jsonify({
+        'status': status,
+        'timestamp': datetime.utcnow().isoformat(),
+        'version': VERSION,
+        **details
+    }), 200 if ready else 503
@@ -0,0 +1,156 @@
+"""Sketches de streaming mescláveis para estatísticas aproximadas.
+
+KllSketch estima quantis e HyperLogLog estima contagens distintas. Ambos
+são mescláveis: sketches diários podem ser combinados no momento da
+consulta sem reler as linhas originais.
+
+Limites de erro (ver kll_rank_error e hll_relative_error):
+- KllSketch(k=200): erro de rank ~1.65% com ~99% de confiança (o p90
+  devolvido fica entre os ranks 88.35% e 91.65%). Exato enquanto houver
+  menos de k valores.
+- HyperLogLog(p=12): erro padrão relativo 1.04/sqrt(4096) ~= 1.6%;
+  quase exato para contagens pequenas (linear counting).
+"""
+import hashlib
+import math
+import random
+import struct
+import zlib
+
+KLL_DEFAULT_K = 200
+HLL_DEFAULT_P = 12
+
+
+def kll_rank_error(k=KLL_DEFAULT_K):
+    """Erro de rank normalizado do KLL com ~99% de confiança.
+
+    Ajuste empírico publicado pelo Apache DataSketches: 2.446 / k^0.9433.
+    """
+    return 2.446 / k ** 0.9433
+
+
+def hll_relative_error(p=HLL_DEFAULT_P):
+    """Erro padrão relativo do HyperLogLog com 2^p registradores."""
+    return 1.04 / math.sqrt(1 << p)
+
+
+class KllSketch:
+    """Sketch de quantis KLL (Karnin, Lang, Liberty 2016)."""
+
+    def __init__(self, k=KLL_DEFAULT_K):
+        self.k = k
+        self.n = 0
+        self.compactors = [[]]
+
+    def update(self, value):
+        self.compactors[0].append(float(value))
+        self.n += 1
+        self._compress()
+
+    def merge(self, other):
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append([])
+        for level, items in enumerate(other.compactors):
+            self.compactors[level].extend(items)
+        self.n += other.n
+        self._compress()
+        return self
+
+    def quantile(self, q):
+        """Menor valor cujo rank acumulado alcança q * n; None se vazio."""
+        weighted = sorted(
+            (value, 1 << level)
+            for level, items in enumerate(self.compactors)
+            for value in items
+        )
+        if not weighted:
+            return None
+        total = sum(weight for _, weight in weighted)
+        target = q * total
+        cumulative = 0
+        for value, weight in weighted:
+            cumulative += weight
+            if cumulative >= target:
+                return value
+        return weighted[-1][0]
+
+    def to_bytes(self):
+        sizes = [len(items) for items in self.compactors]
+        values = [value for items in self.compactors for value in items]
+        header = struct.pack('<HQH', self.k, self.n, len(sizes))
+        return header + struct.pack(f'<{len(sizes)}I', *sizes) + struct.pack(f'<{len(values)}d', *values)
+
+    @classmethod
+    def from_bytes(cls, data):
+        k, n, levels = struct.unpack_from('<HQH', data)
+        offset = struct.calcsize('<HQH')
+        sizes = struct.unpack_from(f'<{levels}I', data, offset)
+        offset += 4 * levels
+        sketch = cls(k)
+        sketch.n = n
+        sketch.compactors = []
+        for size in sizes:
+            sketch.compactors.append(list(struct.unpack_from(f'<{size}d', data, offset)))
+            offset += 8 * size
+        return sketch
+
+    def _capacity(self, level):
+        depth = len(self.compactors) - level - 1
+        return max(int(math.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def _compress(self):
+        while sum(len(items) for items in self.compactors) >= sum(
+                self._capacity(level) for level in range(len(self.compactors))):
+            for level, items in enumerate(self.compactors):
+                if len(items) >= self._capacity(level):
+                    if level + 1 == len(self.compactors):
+                        self.compactors.append([])
+                    items.sort()
+                    # Com quantidade ímpar o último item fica no nível atual
+                    keep = items[-1:] if len(items) % 2 else []
+                    paired = items[:len(items) - len(keep)]
+                    self.compactors[level + 1].extend(paired[random.randint(0, 1)::2])
+                    self.compactors[level] = keep
+                    break
+
+
+class HyperLogLog:
+    """Contador de distintos HyperLogLog com hash estável entre processos."""
+
+    def __init__(self, p=HLL_DEFAULT_P):
+        self.p = p
+        self.registers = bytearray(1 << p)
+
+    def add(self, value):
+        digest = hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).digest()
+        x = int.from_bytes(digest, 'big')
+        index = x >> (64 - self.p)
+        remaining = x & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - remaining.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        if other.p != self.p:
+            raise ValueError("HyperLogLog com precisões diferentes não podem ser mesclados")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self):
+        # Registros esparsos comprimem bem: poucos fornecedores por dia
+        return bytes([self.p]) + zlib.compress(bytes(self.registers))
+
+    @classmethod
+    def from_bytes(cls, data):
+        sketch = cls(data[0])
+        sketch.registers = bytearray(zlib.decompress(data[1:]))
+        return sketch
@@ -6,7 +6,7 @@ import os
 # Adicionar o diretório src ao path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
-from main import app, db, User, Card
+from main import app, db, User, Card, audit_writer, health_monitor
 
 class OrbitAPITestCase(unittest.TestCase):
     def setUp(self):
@@ -31,8 +31,21 @@ class OrbitAPITestCase(unittest.TestCase):
         db.session.add(test_user)
         db.session.commit()
 
+    def auth_headers(self, role='Administrador'):
+        """Gerar cabeçalho Authorization com token JWT de teste"""
+        import jwt
+        from datetime import datetime, timedelta
+        token = jwt.encode({
+            'user_id': 1,
+            'username': 'testuser',
+            'role': role,
+            'exp': datetime.utcnow() + timedelta(hours=1)
+        }, app.config['SECRET_KEY'], algorithm='HS256')
+        return {'Authorization': f'Bearer {token}'}
+
     def tearDown(self):
         """Limpar ambiente de teste"""
+        audit_writer.flush()
         db.session.remove()
         db.drop_all()
         self.app_context.pop()
@@ -46,6 +59,35 @@ class OrbitAPITestCase(unittest.TestCase):
         self.assertEqual(data['status'], 'healthy')
         self.assertIn('timestamp', data)
         self.assertIn('version', data)
+        self.assertNotIn('database', data)
+
+    def test_readiness_check(self):
+        """Testar endpoint de readiness com verificação do banco em cache"""
+        health_monitor.refresh()
+        response = self.app.get('/api/ready')
+        self.assertEqual(response.status_code, 200)
+
+        data = json.loads(response.data)
+        self.assertEqual(data['status'], 'ready')
+        self.assertTrue(data['database']['ok'])
+        self.assertIn('pool', data)
+        if data['pool']['overflow'] is not None:
+            self.assertGreaterEqual(data['pool']['overflow'], 0)
+        self.assertIn('requests_in_flight', data['queues'])
+        self.assertGreaterEqual(data['cache']['hits'], 1)
+
+    def test_readiness_database_down(self):
+        """Testar readiness com falha na última verificação do banco"""
+        from unittest import mock
+        # Sem a thread de verificação, nada sobrescreve o resultado simulado
+        health_monitor.shutdown()
+        health_monitor.refresh()
+        with mock.patch.object(health_monitor, '_ensure_thread'), \
+                mock.patch.object(health_monitor, 'refresh'), \
+                mock.patch.object(health_monitor, 'last_ok', False):
+            response = self.app.get('/api/ready')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(json.loads(response.data)['status'], 'unavailable')
 
     def test_login_success(self):
         """Testar login com credenciais válidas"""
@@ -158,6 +200,392 @@ class OrbitAPITestCase(unittest.TestCase):
         self.assertIn('current_performance', data['metrics'])
         self.assertIn('deadlines', data['metrics'])
 
+    def test_login_audit_events(self):
+        """Testar gravação em lote dos eventos de login"""
+        for password in ['password', 'wrongpassword']:
+            self.app.post('/api/login',
+                          data=json.dumps({
+                              'username': 'testuser',
+                              'password': password
+                          }),
+                          content_type='application/json')
+
+        audit_writer.flush()
+
+        response = self.app.get('/api/audit-events', headers=self.auth_headers())
+        self.assertEqual(response.status_code, 200)
+
+        data = json.loads(response.data)
+        self.assertTrue(data['success'])
+        self.assertEqual([e['event_type'] for e in data['events']],
+                         ['login_failed', 'login_success'])
+        self.assertIsNone(data['next_cursor'])
+
+    def test_card_noop_update_keeps_version(self):
+        """Testar que atribuição sem mudança não gera nova versão"""
+        card = Card(ID_RC='RC-NOOP-1', Criado_Por='testuser', Valor_Estimado=100.0)
+        db.session.add(card)
+        db.session.commit()
+        version = card.row_version
+
+        card.Status = card.Status
+        db.session.commit()
+        self.assertEqual(card.row_version, version)
+
+        data = json.loads(self.app.get(f'/api/cards/changes?since={version}').data)
+        self.assertEqual(data['changes'], [])
+
+    def test_card_audit_events(self):
+        """Testar auditoria de criação, alteração e exclusão de cards"""
+        card = Card(ID_RC='RC-AUDIT-1', Criado_Por='testuser', Valor_Estimado=100.0)
+        db.session.add(card)
+        db.session.commit()
+        card.Status = 'Aprovado'
+        db.session.commit()
+        self.app.delete(f'/api/cards/{card.id}', headers=self.auth_headers())
+
+        rejected = Card(ID_RC='RC-AUDIT-2', Criado_Por='testuser', Valor_Estimado=50.0)
+        db.session.add(rejected)
+        db.session.flush()
+        db.session.rollback()
+
+        audit_writer.flush()
+
+        data = json.loads(self.app.get('/api/audit-events', headers=self.auth_headers()).data)
+        events = [(e['event_type'], e['card_id']) for e in reversed(data['events'])]
+        self.assertEqual(events, [('card_created', card.id),
+                                  ('card_updated', card.id),
+                                  ('card_deleted', card.id)])
+        self.assertEqual(json.loads(data['events'][1]['details'])['fields'], ['Status'])
+
+    def test_audit_events_require_admin(self):
+        """Testar autenticação do endpoint de auditoria"""
+        response = self.app.get('/api/audit-events')
+        self.assertEqual(response.status_code, 401)
+
+        response = self.app.get('/api/audit-events', headers={'Authorization': 'Bearer invalido'})
+        self.assertEqual(response.status_code, 401)
+
+        response = self.app.get('/api/audit-events', headers=self.auth_headers('Analista Backoffice'))
+        self.assertEqual(response.status_code, 403)
+
+        login = json.loads(self.app.post('/api/login',
+                                         data=json.dumps({'username': 'testuser', 'password': 'password'}),
+                                         content_type='application/json').data)
+        response = self.app.get('/api/audit-events', headers={'Authorization': f"Bearer {login['token']}"})
+        self.assertEqual(response.status_code, 200)
+
+    def test_audit_flush_failure(self):
+        """Testar nova tentativa e descarte de eventos com falha na gravação"""
+        from unittest import mock
+        audit_writer.record('login_failed', username='x' * 500)
+        with mock.patch.object(audit_writer, '_insert', side_effect=RuntimeError('banco indisponível')):
+            self.assertEqual(audit_writer.flush(), 0)
+        self.assertEqual(audit_writer.pending(), 1)
+
+        self.assertEqual(audit_writer.flush(), 1)
+        data = json.loads(self.app.get('/api/audit-events', headers=self.auth_headers()).data)
+        self.assertEqual(len(data['events'][0]['username']), 80)
+
+        dropped = audit_writer.dropped
+        audit_writer.record('login_failed', username='testuser')
+        with mock.patch.object(audit_writer, '_insert', side_effect=RuntimeError('banco indisponível')):
+            for _ in range(audit_writer.max_retries + 1):
+                audit_writer.flush()
+        self.assertEqual(audit_writer.pending(), 0)
+        self.assertEqual(audit_writer.dropped, dropped + 1)
+
+    def test_audit_client_ip_behind_proxy(self):
+        """Testar IP do cliente vindo do X-Forwarded-For"""
+        self.app.post('/api/login',
+                      data=json.dumps({'username': 'testuser', 'password': 'wrongpassword'}),
+                      content_type='application/json',
+                      headers={'X-Forwarded-For': '203.0.113.7'})
+        audit_writer.flush()
+
+        data = json.loads(self.app.get('/api/audit-events', headers=self.auth_headers()).data)
+        self.assertEqual(data['events'][0]['ip_address'], '203.0.113.7')
+
+    def test_audit_events_pagination(self):
+        """Testar paginação por cursor dos eventos de auditoria"""
+        for i in range(5):
+            audit_writer.record('card_updated', card_id=i)
+        audit_writer.flush()
+
+        seen = []
+        cursor = None
+        while True:
+            url = '/api/audit-events?limit=2' + (f'&cursor={cursor}' if cursor else '')
+            data = json.loads(self.app.get(url, headers=self.auth_headers()).data)
+            seen.extend(e['card_id'] for e in data['events'])
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+
+        self.assertEqual(sorted(seen), [0, 1, 2, 3, 4])
+
+    def test_request_id_header(self):
+        """Testar propagação do X-Request-ID"""
+        response = self.app.get('/api/sla', headers={'X-Request-ID': 'abc123'})
+        self.assertEqual(response.headers['X-Request-ID'], 'abc123')
+
+        response = self.app.get('/api/sla')
+        self.assertTrue(response.headers['X-Request-ID'])
+
+    def test_routine_request_not_logged_unsampled(self):
+        """Testar que uma requisição rotineira não gera linha de log fora da amostragem"""
+        import logging
+        from unittest import mock
+        from src.logging_config import DeferredQueueHandler, SamplingFilter
+        handler = next(h for h in logging.getLogger().handlers if isinstance(h, DeferredQueueHandler))
+        sampling = next(f for f in handler.filters if isinstance(f, SamplingFilter))
+
+        with mock.patch.object(sampling, 'rate', 0.0), \
+                mock.patch.object(handler, 'enqueue') as enqueue:
+            self.app.get('/api/sla')
+            # Linha equivalente à do servidor de desenvolvimento do Werkzeug
+            logging.getLogger('werkzeug').info('127.0.0.1 - - "GET /api/sla HTTP/1.1" 200 -')
+
+        self.assertEqual(enqueue.call_args_list, [])
+
+    def test_log_sampling(self):
+        """Testar amostragem e formato JSON dos logs"""
+        import logging
+        from logging_config import JsonFormatter, SamplingFilter
+
+        def make_record(**extra):
+            record = logging.LogRecord('test', logging.INFO, __file__, 0, 'Login de %s', ('testuser',), None)
+            record.__dict__.update(extra)
+            return record
+
+        self.assertFalse(SamplingFilter(0.0).filter(make_record(sample=True)))
+        self.assertTrue(SamplingFilter(0.0).filter(make_record()))
+
+        record = make_record(sample=True, request_id='abc123')
+        self.assertTrue(SamplingFilter(1.0).filter(record))
+        entry = json.loads(JsonFormatter().format(record))
+        self.assertEqual(entry['message'], 'Login de testuser')
+        self.assertEqual(entry['request_id'], 'abc123')
+        self.assertEqual(entry['sample_rate'], 1.0)
+        self.assertNotIn('sample', entry)
+
+    def test_card_changes(self):
+        """Testar sincronização incremental de cards com tombstones"""
+        for i in range(3):
+            db.session.add(Card(ID_RC=f'RC-TEST-{i}', Criado_Por='testuser', Valor_Estimado=100.0 * (i + 1)))
+        db.session.commit()
+
+        data = json.loads(self.app.get('/api/cards').data)
+        version = data['version']
+        self.assertEqual(len(data['cards']), 3)
+
+        first = Card.query.filter_by(ID_RC='RC-TEST-0').first()
+        first.Status = 'Aprovado'
+        db.session.commit()
+        second = Card.query.filter_by(ID_RC='RC-TEST-1').first()
+        response = self.app.delete(f'/api/cards/{second.id}')
+        self.assertEqual(response.status_code, 401)
+        response = self.app.delete(f'/api/cards/{second.id}', headers=self.auth_headers('Analista Backoffice'))
+        self.assertEqual(response.status_code, 403)
+        response = self.app.delete(f'/api/cards/{second.id}', headers=self.auth_headers())
+        self.assertEqual(response.status_code, 200)
+
+        data = json.loads(self.app.get(f'/api/cards/changes?since={version}').data)
+        self.assertTrue(data['success'])
+        self.assertFalse(data['has_more'])
+        self.assertEqual([(c['ID_RC'], c['deleted']) for c in data['changes']],
+                         [('RC-TEST-0', False), ('RC-TEST-1', True)])
+        self.assertEqual(data['changes'][0]['Status'], 'Aprovado')
+
+        data = json.loads(self.app.get(f'/api/cards/changes?since={data["next_since"]}').data)
+        self.assertEqual(data['changes'], [])
+
+        data = json.loads(self.app.get('/api/cards/changes?since=0&limit=2').data)
+        self.assertEqual(len(data['changes']), 2)
+        self.assertTrue(data['has_more'])
+
+        data = json.loads(self.app.get('/api/cards').data)
+        self.assertNotIn('RC-TEST-1', [c['ID_RC'] for c in data['cards']])
+
+    def test_value_distribution(self):
+        """Testar estatísticas aproximadas de Valor_Estimado por unidade e mês"""
+        from datetime import datetime
+        cards = [
+            ('Fortaleza', 100.0, 'Fornecedor A', datetime(2025, 5, 2)),
+            ('Fortaleza', 200.0, 'Fornecedor B', datetime(2025, 5, 20)),
+            ('Fortaleza', 300.0, 'Fornecedor A', datetime(2025, 5, 20)),
+            ('Maracanaú', 50.0, 'N/A', datetime(2025, 5, 3)),
+            ('Fortaleza', 900.0, 'Fornecedor C', datetime(2025, 6, 1)),
+        ]
+        for i, (unidade, valor, fornecedor, criado) in enumerate(cards):
+            db.session.add(Card(ID_RC=f'RC-SK-{i}', Criado_Por='testuser', Valor_Estimado=valor,
+                                Unidade=unidade, Fornecedor_Sugerido=fornecedor, Data_Criacao=criado))
+        db.session.commit()
+
+        response = self.app.get('/api/dashboard/value-distribution?start=2025-05-01&end=2025-05-31')
+        self.assertEqual(response.status_code, 200)
+
+        data = json.loads(response.data)
+        self.assertTrue(data['success'])
+        self.assertIn('error_bounds', data)
+        self.assertEqual([(d['Unidade'], d['month']) for d in data['data']],
+                         [('Fortaleza', '2025-05'), ('Maracanaú', '2025-05')])
+        fortaleza = data['data'][0]
+        self.assertEqual(fortaleza['count'], 3)
+        self.assertEqual(fortaleza['p50'], 200.0)
+        self.assertEqual(fortaleza['p99'], 300.0)
+        self.assertEqual(fortaleza['distinct_suppliers'], 2)
+        self.assertEqual(data['data'][1]['distinct_suppliers'], 0)
+
+        response = self.app.get('/api/dashboard/value-distribution?start=maio')
+        self.assertEqual(response.status_code, 400)
+
+    def test_value_distribution_error(self):
+        """Testar resposta JSON quando um sketch não pode ser lido"""
+        from unittest import mock
+        from datetime import datetime
+        from src.sketches import KllSketch, kll_rank_error
+        db.session.add(Card(ID_RC='RC-SK-ERR', Criado_Por='testuser', Valor_Estimado=10.0,
+                            Unidade='Fortaleza', Data_Criacao=datetime(2025, 5, 2)))
+        db.session.commit()
+
+        data = json.loads(self.app.get('/api/dashboard/value-distribution').data)
+        self.assertEqual(data['error_bounds']['quantiles']['rank_error'], round(kll_rank_error(200), 4))
+
+        with mock.patch.object(KllSketch, 'from_bytes', side_effect=ValueError('sketch corrompido')):
+            response = self.app.get('/api/dashboard/value-distribution')
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(json.loads(response.data)['success'])
+
+    def test_value_distribution_existing_row(self):
+        """Testar inserção de card quando a linha do sketch já foi criada por outra transação"""
+        from datetime import datetime
+        from src.models.card_sketch import _ensure_sketch_row
+        created = datetime(2025, 7, 10)
+        _ensure_sketch_row(db.session.connection(), 'Fortaleza', created.date())
+        _ensure_sketch_row(db.session.connection(), 'Fortaleza', created.date())
+        db.session.add(Card(ID_RC='RC-UP-1', Criado_Por='testuser', Valor_Estimado=100.0,
+                            Unidade='Fortaleza', Data_Criacao=created))
+        db.session.commit()
+
+        data = json.loads(self.app.get('/api/dashboard/value-distribution').data)['data']
+        self.assertEqual([(d['Unidade'], d['count'], d['p50']) for d in data], [('Fortaleza', 1, 100.0)])
+
+    def test_value_distribution_backfill_matches_live(self):
+        """Testar que o backfill conta os mesmos cards que a atualização ao vivo"""
+        from datetime import datetime
+        from src.models.card_sketch import CardValueSketch, backfill_card_sketches
+        created = datetime(2025, 7, 10)
+        for i in range(4):
+            db.session.add(Card(ID_RC=f'RC-BF-{i}', Criado_Por='testuser', Valor_Estimado=100.0 * (i + 1),
+                                Unidade='Fortaleza', Fornecedor_Sugerido=f'Fornecedor {i}', Data_Criacao=created))
+        db.session.commit()
+        card = Card.query.filter_by(ID_RC='RC-BF-3').first()
+        self.app.delete(f'/api/cards/{card.id}', headers=self.auth_headers())
+
+        live = json.loads(self.app.get('/api/dashboard/value-distribution').data)['data']
+        CardValueSketch.query.delete()
+        db.session.commit()
+        self.assertEqual(backfill_card_sketches(), 3)
+        backfilled = json.loads(self.app.get('/api/dashboard/value-distribution').data)['data']
+
+        self.assertEqual(live[0]['count'], 3)
+        self.assertEqual(live, backfilled)
+
+    def test_value_distribution_follows_card_writes(self):
+        """Testar recálculo dos sketches quando cards são alterados, movidos ou excluídos"""
+        from datetime import datetime
+        for i in range(3):
+            db.session.add(Card(ID_RC=f'RC-UPD-{i}', Criado_Por='testuser', Valor_Estimado=100.0 * (i + 1),
+                                Unidade='Fortaleza', Fornecedor_Sugerido=f'Fornecedor {i}',
+                                Data_Criacao=datetime(2025, 8, 5)))
+        db.session.commit()
+
+        def distribution():
+            data = json.loads(self.app.get('/api/dashboard/value-distribution').data)['data']
+            return {(d['Unidade'], d['month']): d for d in data}
+
+        card = Card.query.filter_by(ID_RC='RC-UPD-0').first()
+        card.Valor_Estimado = 999999.0
+        db.session.commit()
+        self.assertEqual(distribution()[('Fortaleza', '2025-08')]['p99'], 999999.0)
+
+        card = Card.query.filter_by(ID_RC='RC-UPD-1').first()
+        db.session.commit()  # expira os atributos: o valor anterior precisa ser recarregado
+        card.Unidade = 'Maracanaú'
+        db.session.commit()
+        data = distribution()
+        self.assertEqual(data[('Fortaleza', '2025-08')]['count'], 2)
+        self.assertEqual(data[('Maracanaú', '2025-08')]['p50'], 200.0)
+
+        self.app.delete(f'/api/cards/{card.id}', headers=self.auth_headers())
+        data = distribution()
+        self.assertNotIn(('Maracanaú', '2025-08'), data)
+        self.assertEqual(data[('Fortaleza', '2025-08')]['distinct_suppliers'], 2)
+
+class LegacyDatabaseTestCase(unittest.TestCase):
+    OLD_SCHEMA = """
+        CREATE TABLE user (
+            id INTEGER NOT NULL, username VARCHAR(80) NOT NULL, password_hash VARCHAR(120) NOT NULL,
+            role VARCHAR(50) NOT NULL, created_at DATETIME, PRIMARY KEY (id), UNIQUE (username));
+        CREATE TABLE card (
+            id INTEGER NOT NULL, "ID_RC" VARCHAR(50) NOT NULL, "Criado_Por" VARCHAR(120) NOT NULL,
+            "Valor_Estimado" FLOAT NOT NULL, "Status" VARCHAR(50), "Tipo_Requisicao" VARCHAR(50),
+            "Unidade" VARCHAR(100), "Fornecedor_Sugerido" VARCHAR(120), "Data_Criacao" DATETIME,
+            PRIMARY KEY (id), UNIQUE ("ID_RC"));
+        CREATE TABLE card_version_counter (id INTEGER NOT NULL, value BIGINT NOT NULL, PRIMARY KEY (id));
+    """
+
+    STARTUP = """
+import json, sys
+sys.path.insert(0, sys.argv[1])
+from main import app, db, init_database, Card
+with app.app_context():
+    init_database()
+    init_database()
+    db.session.add(Card(ID_RC='RC-NOVO', Criado_Por='admin', Valor_Estimado=10.0))
+    db.session.commit()
+client = app.test_client()
+print(json.dumps({
+    'cards': client.get('/api/cards').get_json(),
+    'changes': client.get('/api/cards/changes?since=0&limit=500').get_json(),
+    'stats': client.get('/api/dashboard-stats').status_code
+}))
+"""
+
+    def test_startup_migrates_old_schema(self):
+        """Testar inicialização contra um banco SQLite com o esquema antigo"""
+        import sqlite3
+        import subprocess
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'orbit.db')
+            connection = sqlite3.connect(path)
+            connection.executescript(self.OLD_SCHEMA)
+            connection.executemany(
+                'INSERT INTO card (id, "ID_RC", "Criado_Por", "Valor_Estimado", "Unidade") VALUES (?, ?, ?, ?, ?)',
+                [(i, f'RC-OLD-{i}', 'admin', 100.0 * i, 'Fortaleza') for i in range(1, 4)]
+            )
+            connection.commit()
+            connection.close()
+
+            src = os.path.join(os.path.dirname(__file__), '..', 'src')
+            result = subprocess.run(
+                [sys.executable, '-c', self.STARTUP, src],
+                env=dict(os.environ, DATABASE_URL=f'sqlite:///{path}'),
+                cwd=os.path.join(os.path.dirname(__file__), '..'),
+                capture_output=True, text=True, timeout=60
+            )
+            self.assertEqual(result.returncode, 0, result.stderr)
+            data = json.loads(result.stdout.strip().splitlines()[-1])
+
+        self.assertEqual(data['stats'], 200)
+        self.assertTrue(data['cards']['success'])
+        self.assertEqual(data['cards']['version'], 4)
+        versions = {c['ID_RC']: c['row_version'] for c in data['changes']['changes']}
+        self.assertEqual(versions, {'RC-OLD-1': 1, 'RC-OLD-2': 2, 'RC-OLD-3': 3, 'RC-NOVO': 4})
+
 if __name__ == '__main__':
     unittest.main()
 
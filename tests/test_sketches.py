@@ -0,0 +1,39 @@
+import unittest
+import random
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.sketches import KllSketch, HyperLogLog
+
+class SketchTestCase(unittest.TestCase):
+    def test_kll_rank_error(self):
+        """Testar erro de rank do KLL dentro do limite documentado"""
+        values = list(range(1, 20001))
+        random.Random(7).shuffle(values)
+        left, right = KllSketch(), KllSketch()
+        for value in values[:10000]:
+            left.update(value)
+        for value in values[10000:]:
+            right.update(value)
+        sketch = KllSketch.from_bytes(left.merge(right).to_bytes())
+
+        self.assertEqual(sketch.n, 20000)
+        for q in (0.5, 0.9, 0.99):
+            rank = sketch.quantile(q) / 20000
+            self.assertLess(abs(rank - q), 0.0165)
+
+    def test_hyperloglog_count(self):
+        """Testar contagem de distintos do HyperLogLog após mescla"""
+        left, right = HyperLogLog(), HyperLogLog()
+        for i in range(6000):
+            left.add(f'Fornecedor {i}')
+        for i in range(4000, 10000):
+            right.add(f'Fornecedor {i}')
+        sketch = HyperLogLog.from_bytes(left.merge(right).to_bytes())
+
+        self.assertLess(abs(sketch.count() - 10000) / 10000, 0.05)
+
+if __name__ == '__main__':
+    unittest.main()